@@ -0,0 +1,594 @@
+# Offline load test for the Dental Quest API. Runs the ASGI app in-process against an in-memory
+# stand-in for MongoDB and a fake Groq client, drives mixed traffic (lesson browsing, classroom quiz
+# bursts, tutor questions) and reports latency percentiles and throughput per endpoint.
+#
+#   python benchmark.py --duration 20 --db-latency-ms 2 --llm-latency-ms 400
+#   python benchmark.py --quiz-write-mode write_behind --compare bench_results/<previous>.json
+#
+# Results are written to bench_results/ as JSON so runs can be diffed; --compare exits non-zero when
+# any endpoint's p95 regresses by more than --regression-threshold percent.
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+import server  # noqa: E402
+
+RESULTS_DIR = Path(__file__).parent / "bench_results"
+
+
+# --- In-memory MongoDB stand-in ---
+# Implements the subset of the Motor collection API that server.py uses, with an optional per-call
+# delay to model network round-trips.
+def _get_path(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _set_path(doc, path, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _compare(value, op, arg):
+    if value is None:
+        return False
+    try:
+        return {"$lt": value < arg, "$lte": value <= arg, "$gt": value > arg, "$gte": value >= arg}[op]
+    except TypeError:
+        return False
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = _get_path(doc, key)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, arg in condition.items():
+                if op in ("$lt", "$lte", "$gt", "$gte"):
+                    if not _compare(value, op, arg):
+                        return False
+                elif op == "$in":
+                    if value not in arg:
+                        return False
+                elif op == "$ne":
+                    if value == arg:
+                        return False
+                elif op == "$type":
+                    if arg != "string" or not isinstance(value, str):
+                        return False
+                else:
+                    raise NotImplementedError(f"query operator {op}")
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return copy.deepcopy(doc)
+    included = {key.split(".")[0] for key, flag in projection.items() if flag and key != "_id"}
+    if included:
+        result = {key: copy.deepcopy(doc[key]) for key in included if key in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        return result
+    return {key: copy.deepcopy(value) for key, value in doc.items() if projection.get(key, 1)}
+
+
+def _sort_key(value):
+    return (value is not None, value)
+
+
+def _apply_update(doc, update):
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            current = _get_path(doc, path)
+            if op == "$set":
+                _set_path(doc, path, arg)
+            elif op == "$inc":
+                _set_path(doc, path, (current or 0) + arg)
+            elif op == "$max":
+                if current is None or arg > current:
+                    _set_path(doc, path, arg)
+            elif op == "$unset":
+                parent_path, _, key = path.rpartition(".")
+                parent = _get_path(doc, parent_path) if parent_path else doc
+                if isinstance(parent, dict):
+                    parent.pop(key, None)
+            else:
+                raise NotImplementedError(f"update operator {op}")
+
+
+class InMemoryCursor:
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = []
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=1):
+        self._sort = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction)]
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def _results(self):
+        docs = [doc for doc in self._collection.candidates(self._query) if _matches(doc, self._query)]
+        for key, direction in reversed(self._sort):
+            docs.sort(key=lambda doc: _sort_key(_get_path(doc, key)), reverse=direction < 0)
+        if self._limit:
+            docs = docs[:self._limit]
+        return [_project(doc, self._projection) for doc in docs]
+
+    async def to_list(self, length=None):
+        await self._collection.delay()
+        docs = self._results()
+        return docs if length is None else docs[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        await self._collection.delay()
+        for doc in self._results():
+            yield doc
+
+
+# Equality lookups on these fields use a hash index instead of scanning, so the stand-in's own cost
+# does not swamp the latencies being measured. Indexed fields must not be changed by updates.
+INDEXED_FIELDS = ("id", "user_id", "email")
+
+
+class InMemoryCollection:
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.docs = []
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+
+    def _reindex(self):
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        for doc in self.docs:
+            self._index(doc)
+
+    def _index(self, doc):
+        for field, index in self._indexes.items():
+            if field in doc:
+                index.setdefault(doc[field], []).append(doc)
+
+    def candidates(self, query):
+        for field, index in self._indexes.items():
+            value = query.get(field)
+            if value is not None and not isinstance(value, dict):
+                return index.get(value, [])
+        return self.docs
+
+    async def delay(self):
+        self.database.operations += 1
+        if self.database.latency:
+            await asyncio.sleep(self.database.latency)
+
+    def find(self, query=None, projection=None):
+        return InMemoryCursor(self, query or {}, projection)
+
+    async def find_one(self, query=None, projection=None):
+        await self.delay()
+        for doc in self.candidates(query or {}):
+            if _matches(doc, query or {}):
+                return _project(doc, projection)
+        return None
+
+    async def count_documents(self, query):
+        await self.delay()
+        return sum(1 for doc in self.candidates(query) if _matches(doc, query))
+
+    def _insert(self, doc):
+        doc.setdefault("_id", ObjectId())
+        stored = copy.deepcopy(doc)
+        self.docs.append(stored)
+        self._index(stored)
+
+    async def insert_one(self, doc):
+        await self.delay()
+        self._insert(doc)
+        return types.SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs, ordered=True):
+        await self.delay()
+        for doc in docs:
+            self._insert(doc)
+        return types.SimpleNamespace(inserted_ids=[doc["_id"] for doc in docs])
+
+    def _update(self, query, update, upsert, replace=False):
+        for doc in self.candidates(query):
+            if _matches(doc, query):
+                if replace:
+                    replacement = {"_id": doc["_id"], **copy.deepcopy(update)}
+                    doc.clear()
+                    doc.update(replacement)
+                    self._reindex()
+                else:
+                    _apply_update(doc, update)
+                return 1, 0
+        if upsert:
+            doc = {key: value for key, value in query.items() if not key.startswith("$") and not isinstance(value, dict)}
+            if replace:
+                doc.update(copy.deepcopy(update))
+            else:
+                _apply_update(doc, update)
+            self._insert(doc)
+            return 0, 1
+        return 0, 0
+
+    async def update_one(self, query, update, upsert=False):
+        await self.delay()
+        modified, upserted = self._update(query, update, upsert)
+        return types.SimpleNamespace(matched_count=modified, modified_count=modified, upserted_id=None if not upserted else True)
+
+    async def replace_one(self, query, doc, upsert=False):
+        await self.delay()
+        modified, upserted = self._update(query, doc, upsert, replace=True)
+        return types.SimpleNamespace(matched_count=modified, modified_count=modified)
+
+    async def bulk_write(self, operations, ordered=True):
+        await self.delay()
+        inserted = modified = upserted = 0
+        for operation in operations:
+            if isinstance(operation, InsertOne):
+                self._insert(operation._doc)
+                inserted += 1
+            elif isinstance(operation, (UpdateOne, ReplaceOne)):
+                changed, created = self._update(operation._filter, operation._doc, operation._upsert, replace=isinstance(operation, ReplaceOne))
+                modified += changed
+                upserted += created
+            else:
+                raise NotImplementedError(type(operation).__name__)
+        return types.SimpleNamespace(inserted_count=inserted, modified_count=modified, matched_count=modified, upserted_count=upserted)
+
+    async def delete_many(self, query):
+        await self.delay()
+        before = len(self.docs)
+        self.docs = [doc for doc in self.docs if not _matches(doc, query)]
+        self._reindex()
+        return types.SimpleNamespace(deleted_count=before - len(self.docs))
+
+    async def create_indexes(self, indexes):
+        return [index.document["name"] for index in indexes]
+
+    def aggregate(self, pipeline):
+        if len(pipeline) != 1 or "$out" not in pipeline[0]:
+            raise NotImplementedError("only a single $out stage is supported")
+        return InMemoryCopyCursor(self, self.database[pipeline[0]["$out"]])
+
+    async def rename(self, new_name, dropTarget=False):
+        await self.delay()
+        collections = self.database._collections
+        if new_name in collections and not dropTarget:
+            raise ValueError(f"collection {new_name} already exists")
+        collections.pop(self.name, None)
+        self.name = new_name
+        collections[new_name] = self
+
+    async def drop(self):
+        await self.delay()
+        self.database._collections.pop(self.name, None)
+
+
+class InMemoryCopyCursor:
+    """Result of aggregate([{"$out": ...}]): the copy runs when the cursor is consumed and yields no documents."""
+    def __init__(self, source, target):
+        self._source = source
+        self._target = target
+
+    async def to_list(self, length=None):
+        await self._source.delay()
+        self._target.docs = copy.deepcopy(self._source.docs)
+        self._target._reindex()
+        return []
+
+
+class InMemoryDatabase:
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.operations = 0
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = InMemoryCollection(self, name)
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    async def command(self, *args, **kwargs):
+        raise NotImplementedError("commands are not supported by the in-memory database")
+
+
+# --- Fake Groq client ---
+class FakeCompletions:
+    def __init__(self, latency_ms, tokens):
+        self.latency = latency_ms / 1000
+        self.tokens = tokens
+        self.calls = 0
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        words = [f"word{i} " for i in range(self.tokens)]
+        usage = types.SimpleNamespace(prompt_tokens=sum(len(m["content"]) // 4 for m in messages), completion_tokens=self.tokens, total_tokens=0)
+        if not stream:
+            await asyncio.sleep(self.latency)
+            message = types.SimpleNamespace(content="".join(words))
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+        async def chunks():
+            # First token after ~20% of the latency, the rest spread over the remainder.
+            await asyncio.sleep(self.latency * 0.2)
+            for word in words:
+                await asyncio.sleep(self.latency * 0.8 / len(words))
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=word))], usage=None)
+        return chunks()
+
+
+class FakeGroq:
+    def __init__(self, latency_ms, tokens):
+        self.chat = types.SimpleNamespace(completions=FakeCompletions(latency_ms, tokens))
+
+
+# --- Traffic ---
+TUTOR_QUESTIONS = ["How long should I brush?", "Why do we need fluoride?", "What foods are bad for teeth?", "How do cavities form?", "What's the best way to floss?"]
+
+
+def seed_database(db, lessons, users):
+    now = datetime.now(timezone.utc)
+    lesson_docs = []
+    for index in range(lessons):
+        questions = [{"question": f"Question {q}?", "options": ["A", "B", "C"], "correct_answer": random.choice("ABC")} for q in range(5)]
+        lesson_docs.append({"_id": ObjectId(), "id": str(uuid.uuid4()), "title": f"Lesson {index}", "description": f"Description {index}", "level": 1 + index % 3, "content": {"key_points": [f"Point {p}" for p in range(10)], "body": "lorem ipsum " * 200}, "quiz_questions": questions, "created_at": now})
+    user_docs = [{"_id": ObjectId(), "id": str(uuid.uuid4()), "username": f"student{index}", "email": f"student{index}@example.com", "level": 1 + index % 3, "total_score": 0, "achievements": [], "created_at": now, "last_active": now} for index in range(users)]
+    for doc in lesson_docs:
+        db.lessons._insert(doc)
+    for doc in user_docs:
+        db.users._insert(doc)
+    return lesson_docs, user_docs
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, label, request):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await request
+        except Exception:
+            pass
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(label, []).append(elapsed_ms)
+        if response is None or response.status_code >= 400:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+
+async def browse(client, recorder, lessons, users, stop_at):
+    etag = None
+    while time.perf_counter() < stop_at:
+        user = random.choice(users)
+        headers = {"If-None-Match": etag} if etag and random.random() < 0.5 else {}
+        response = await recorder.call("GET /lessons", client.get("/lessons", headers=headers))
+        if response is not None and response.headers.get("etag"):
+            etag = response.headers["etag"]
+        await recorder.call("GET /lessons/{lesson_id}", client.get(f"/lessons/{random.choice(lessons)['id']}"))
+        await recorder.call("GET /users/{user_id}/summary", client.get(f"/users/{user['id']}/summary"))
+        await recorder.call("GET /users/{user_id}/recommendations", client.get(f"/users/{user['id']}/recommendations"))
+        await recorder.call("GET /users/{user_id}/progress/page", client.get(f"/users/{user['id']}/progress/page", params={"limit": 10}))
+        await recorder.call("GET /leaderboard", client.get("/leaderboard"))
+        await asyncio.sleep(random.uniform(0.01, 0.05))
+
+
+def quiz_answers(lesson):
+    return [{"selected_option": question["correct_answer"] if random.random() < 0.7 else "A"} for question in lesson["quiz_questions"]]
+
+
+async def classroom(client, recorder, lessons, users, stop_at, class_size, interval):
+    while time.perf_counter() < stop_at:
+        lesson = random.choice(lessons)
+        students = random.sample(users, min(class_size, len(users)))
+        await asyncio.gather(*[recorder.call("POST /quiz/submit", client.post("/quiz/submit", json={"user_id": student["id"], "lesson_id": lesson["id"], "answers": quiz_answers(lesson)})) for student in students])
+        await recorder.call("POST /quiz/submit-batch", client.post("/quiz/submit-batch", json={"submissions": [{"user_id": student["id"], "lesson_id": lesson["id"], "answers": quiz_answers(lesson)} for student in students]}))
+        await asyncio.sleep(interval)
+
+
+async def tutor(client, recorder, users, stop_at):
+    while time.perf_counter() < stop_at:
+        payload = {"question": random.choice(TUTOR_QUESTIONS) if random.random() < 0.8 else f"Unique question {uuid.uuid4()}", "user_id": random.choice(users)["id"]}
+        if random.random() < 0.5:
+            await recorder.call("POST /ai/ask", client.post("/ai/ask", json=payload))
+        else:
+            await recorder.call("POST /ai/ask/stream", client.post("/ai/ask/stream", json=payload))
+        await asyncio.sleep(random.uniform(0.05, 0.2))
+
+
+# --- Payload sizes ---
+# Wire bytes and latency of /lessons per view and content encoding, next to the per-request cost of the
+# old response_model path (validate every document with pydantic, then encode) measured in-process.
+PAYLOAD_VARIANTS = [("full", "identity"), ("full", "gzip"), ("full", "br"), ("summary", "identity"), ("summary", "gzip"), ("summary", "br")]
+
+
+async def measure_payloads(client, lessons, rounds):
+    payloads = {}
+    docs = [{key: value for key, value in doc.items() if key != "_id"} for doc in lessons]
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        body = json.dumps(jsonable_encoder([server.Lesson(**doc) for doc in docs])).encode("utf-8")
+        samples.append((time.perf_counter() - started) * 1000)
+    payloads["full/pydantic (in-process)"] = {"bytes": len(body), "p50_ms": round(statistics.median(samples), 3)}
+    for view, encoding in PAYLOAD_VARIANTS:
+        samples = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            response = await client.get("/lessons", params={"view": view}, headers={"Accept-Encoding": encoding})
+            samples.append((time.perf_counter() - started) * 1000)
+        payloads[f"{view}/{response.headers.get('content-encoding', 'identity')}"] = {"bytes": int(response.headers["content-length"]), "p50_ms": round(statistics.median(samples), 3)}
+    return payloads
+
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for label, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        endpoints[label] = {"count": len(ordered), "errors": recorder.errors.get(label, 0), "rps": round(len(ordered) / elapsed, 2), "mean_ms": round(statistics.fmean(ordered), 3), "p50_ms": round(percentile(ordered, 0.50), 3), "p95_ms": round(percentile(ordered, 0.95), 3), "p99_ms": round(percentile(ordered, 0.99), 3)}
+    return endpoints
+
+
+def print_report(result, baseline=None):
+    print(f"\n{'endpoint':<38}{'count':>8}{'err':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'Δp95':>9}")
+    for label, stats in result["endpoints"].items():
+        delta = ""
+        previous = (baseline or {}).get("endpoints", {}).get(label)
+        if previous and previous["p95_ms"]:
+            delta = f"{(stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100:+.1f}%"
+        print(f"{label:<38}{stats['count']:>8}{stats['errors']:>6}{stats['rps']:>9}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{delta:>9}")
+    if result.get("payloads"):
+        print(f"\n{'GET /lessons payload':<38}{'bytes':>10}{'p50 ms':>10}")
+        for label, stats in result["payloads"].items():
+            print(f"{label:<38}{stats['bytes']:>10}{stats['p50_ms']:>10}")
+    print(f"\ntotal: {result['total_requests']} requests in {result['elapsed_s']}s ({result['total_rps']} req/s), {result['db_operations']} db operations, {result['llm_calls']} LLM calls")
+
+
+def regressions(result, baseline, threshold):
+    found = []
+    for label, stats in result["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(label)
+        if previous and previous["p95_ms"] and (stats["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100 > threshold:
+            found.append(label)
+    return found
+
+
+async def run(args):
+    random.seed(args.seed)
+    db = InMemoryDatabase(args.db_latency_ms)
+    lessons, users = seed_database(db, args.lessons, args.users)
+    server.app.db = db
+    server.groq_client = FakeGroq(args.llm_latency_ms, args.llm_tokens)
+    await server.quiz_writer.set_mode(args.quiz_write_mode)
+    server.tutor_admission = server.TutorAdmission(server.llm_slots, args.ai_user_rate, server.AI_USER_BURST, args.ai_global_rate, server.AI_GLOBAL_BURST, server.AI_LIMITER_MAX_USERS)
+
+    transport = httpx.ASGITransport(app=server.app)
+    recorder = Recorder()
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        # Warm the lesson catalog and leaderboard so one-off loads are not reported as request latency.
+        await client.get("/lessons")
+        await client.get("/leaderboard")
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        workers = [browse(client, recorder, lessons, users, stop_at) for _ in range(args.browsers)]
+        workers += [classroom(client, recorder, lessons, users, stop_at, args.class_size, args.class_interval) for _ in range(args.classrooms)]
+        workers += [tutor(client, recorder, users, stop_at) for _ in range(args.tutor_users)]
+        await asyncio.gather(*workers)
+        await server.quiz_writer.drain()
+        elapsed = time.perf_counter() - started
+        payloads = await measure_payloads(client, lessons, args.payload_rounds) if args.payload_rounds else {}
+
+    endpoints = summarize(recorder, elapsed)
+    total = sum(stats["count"] for stats in endpoints.values())
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": vars(args) | {"compare": None, "output": None},
+        "elapsed_s": round(elapsed, 3),
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 2),
+        "db_operations": db.operations,
+        "llm_calls": server.groq_client.chat.completions.calls,
+        "tutor_cache": server.tutor_cache.stats(),
+        "ai_admission": server.tutor_admission.stats(),
+        "quiz_writes": server.quiz_writer.stats(),
+        "endpoints": endpoints,
+        "payloads": payloads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the Dental Quest API")
+    parser.add_argument("--duration", type=float, default=15, help="seconds of traffic to generate")
+    parser.add_argument("--browsers", type=int, default=20, help="concurrent lesson-browsing users")
+    parser.add_argument("--classrooms", type=int, default=2, help="concurrent classrooms submitting quiz bursts")
+    parser.add_argument("--class-size", type=int, default=30)
+    parser.add_argument("--class-interval", type=float, default=1.0, help="seconds between a classroom's bursts")
+    parser.add_argument("--tutor-users", type=int, default=10, help="concurrent users asking the AI tutor")
+    parser.add_argument("--lessons", type=int, default=60)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--db-latency-ms", type=float, default=1.0, help="simulated round-trip per database call")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0, help="simulated LLM response time")
+    parser.add_argument("--llm-tokens", type=int, default=60)
+    parser.add_argument("--ai-user-rate", type=float, default=0, help="tutor requests per user per minute (0 disables the per-user limit)")
+    parser.add_argument("--ai-global-rate", type=float, default=0, help="tutor requests per minute across all users (0 disables the global limit)")
+    parser.add_argument("--quiz-write-mode", choices=server.QUIZ_WRITE_MODES, default="sync")
+    parser.add_argument("--payload-rounds", type=int, default=50, help="requests per /lessons view and encoding in the payload report (0 to skip)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="result file (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", help="previous result file to diff against")
+    parser.add_argument("--regression-threshold", type=float, default=20.0, help="allowed p95 increase in percent")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"results written to {output}")
+
+    if baseline:
+        regressed = regressions(result, baseline, args.regression_threshold)
+        if regressed:
+            print(f"p95 regressed by more than {args.regression_threshold}% on: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
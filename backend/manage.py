@@ -0,0 +1,165 @@
+# Maintenance commands for the Dental Quest backend. Run from the backend directory:
+#   python manage.py ensure-indexes
+#   python manage.py explain-queries
+#   python manage.py rebuild-summaries [--user-id ID]
+#   python manage.py rebuild-recommendations [--batch-size N]
+#   python manage.py migrate-timestamps [--batch-size N] [--pause-ms MS] [--restart]
+#   python manage.py profile-startup [--top N]
+#   python manage.py import-lessons FILE [--batch-size N] [--prune]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+
+def connect():
+    mongo_url = os.environ.get("MONGO_URL")
+    db_name = os.environ.get("DB_NAME")
+    if not mongo_url or not db_name:
+        sys.exit("MONGO_URL and DB_NAME environment variables must be set.")
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000, tz_aware=True)
+    return client, client[db_name]
+
+
+async def ensure_indexes(args):
+    client, db = connect()
+    try:
+        await server.ensure_indexes(db)
+        print("Indexes ensured.")
+    finally:
+        client.close()
+
+
+async def explain_queries(args):
+    client, db = connect()
+    try:
+        report = await server.audit_query_plans(db)
+    finally:
+        client.close()
+    for entry in report:
+        status = "ok" if entry["index_backed"] else "NOT INDEX-BACKED"
+        print(f"{status:>17}  {entry['route']:<45} {entry['collection']}.{json.dumps(entry['filter'])}  stages={','.join(entry['stages']) or entry.get('error', '-')}")
+    if not all(entry["index_backed"] for entry in report):
+        sys.exit(1)
+
+
+async def rebuild_summaries(args):
+    client, db = connect()
+    try:
+        rebuilt = await server.rebuild_user_stats(db, args.user_id)
+    finally:
+        client.close()
+    print(f"Rebuilt {rebuilt} user summaries.")
+
+
+async def rebuild_recommendations(args):
+    client, db = connect()
+    try:
+        started = time.perf_counter()
+        rebuilt = await server.rebuild_recommendations(db, args.batch_size, log=print)
+    finally:
+        client.close()
+    print(f"Rebuilt recommendations for {rebuilt} users in {time.perf_counter() - started:.1f}s.")
+
+
+async def migrate_timestamps(args):
+    client, db = connect()
+    try:
+        if args.restart:
+            await db.migrations.delete_many({"_id": {"$regex": "^bson_datetimes:"}})
+        migrated = await server.migrate_timestamps(db, args.batch_size, args.pause_ms / 1000, log=print)
+    finally:
+        client.close()
+    for collection, count in migrated.items():
+        print(f"{collection}: {count} timestamps converted")
+
+
+async def read_chunks(path, chunk_size=64 * 1024):
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+
+async def import_lessons(args):
+    client, db = connect()
+    try:
+        report = await server.import_lesson_stream(db, read_chunks(args.file), args.batch_size, args.prune, log=print)
+    except ValueError as e:
+        sys.exit(f"Import failed: {e}")
+    finally:
+        client.close()
+    for error in report["errors"]:
+        print(f"  record {error['record']} ({error['id'] or 'no id'}): {error['error']}")
+    print(f"Imported {report['imported']} lessons ({report['upserted']} new, {report['updated']} updated, {report['invalid']} invalid, {report['pruned']} pruned) in {report['elapsed_s']}s ({report['records_per_second']} records/s).")
+    if report["invalid"]:
+        sys.exit(1)
+
+
+async def profile_startup(args):
+    # Import server.py in a fresh interpreter with -X importtime and report the slowest top-level packages.
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - started
+    packages = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        if not cumulative.isdigit():
+            continue
+        depth = (len(line.split("|")[2]) - len(line.split("|")[2].lstrip())) // 2
+        if name == "server":
+            total_us = int(cumulative)
+        elif depth == 1:
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    print(f"interpreter + import wall time: {wall * 1000:.0f} ms")
+    print(f"import server (cumulative): {total_us / 1000:.0f} ms")
+    for package, micros in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {micros / 1000:8.1f} ms  {package}")
+
+
+COMMANDS = {
+    "ensure-indexes": ensure_indexes,
+    "explain-queries": explain_queries,
+    "rebuild-summaries": rebuild_summaries,
+    "rebuild-recommendations": rebuild_recommendations,
+    "migrate-timestamps": migrate_timestamps,
+    "profile-startup": profile_startup,
+    "import-lessons": import_lessons,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dental Quest maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ensure-indexes", help="create the indexes the API relies on")
+    subparsers.add_parser("explain-queries", help="report route queries that are not index-backed")
+    rebuild = subparsers.add_parser("rebuild-summaries", help="recompute per-user stats rollups from user_progress")
+    rebuild.add_argument("--user-id", help="rebuild a single user instead of everyone")
+    recommendations = subparsers.add_parser("rebuild-recommendations", help="recompute stored next-lesson recommendations for every user")
+    recommendations.add_argument("--batch-size", type=int, default=1000, help="users ranked per matrix")
+    migrate = subparsers.add_parser("migrate-timestamps", help="convert ISO-string timestamps to native BSON dates")
+    migrate.add_argument("--batch-size", type=int, default=500)
+    migrate.add_argument("--pause-ms", type=float, default=0, help="sleep between batches to limit load")
+    migrate.add_argument("--restart", action="store_true", help="ignore saved checkpoints and rescan from the start")
+    profile = subparsers.add_parser("profile-startup", help="report import-time cost of server.py by package")
+    profile.add_argument("--top", type=int, default=10)
+    lessons = subparsers.add_parser("import-lessons", help="upsert lessons from an NDJSON file or JSON array")
+    lessons.add_argument("file")
+    lessons.add_argument("--batch-size", type=int, default=server.LESSON_IMPORT_BATCH_SIZE)
+    lessons.add_argument("--prune", action="store_true", help="delete lessons that are not in the file")
+    args = parser.parse_args()
+    asyncio.run(COMMANDS[args.command](args))
+
+
+if __name__ == "__main__":
+    main()
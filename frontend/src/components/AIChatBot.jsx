@@ -2,7 +2,6 @@ import React, { useState, useRef, useEffect } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
-import axios from "axios";
 import { Card, CardContent, CardHeader, CardTitle } from "./ui/card";
 import { Button } from "./ui/button";
 import { Input } from "./ui/input";
@@ -74,27 +73,89 @@ const AIChatBot = ({ onClose, user, lessonContext = null }) => {
     setCurrentMessage("");
     setIsLoading(true);
 
-    try {
-      const context = lessonContext
-        ? `Current lesson: ${lessonContext.title}. Lesson content: ${lessonContext.description}`
-        : "";
+    const aiMessageId = Date.now() + 1;
+    // Drops the streamed reply (empty or partial) so an error bubble replaces it.
+    const withoutAiMessage = (prev) =>
+      prev.filter((message) => message.id !== aiMessageId);
 
-      const response = await axios.post(`${API}/ai/ask`, {
-        question: messageText,
-        context: context,
-        user_id: user?.id,
+    try {
+      const response = await fetch(`${API}/ai/ask/stream`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          question: messageText,
+          lesson_id: lessonContext?.id,
+          user_id: user?.id,
+        }),
       });
+      if (response.status === 429) {
+        const busyError = new Error("AI tutor is busy");
+        busyError.retryAfter = Number(response.headers.get("Retry-After")) || 5;
+        throw busyError;
+      }
+      if (!response.ok || !response.body) {
+        throw new Error(`AI stream failed with status ${response.status}`);
+      }
 
-      const aiMessage = {
-        id: Date.now() + 1,
-        type: "ai",
-        content: response.data.response,
-        timestamp: new Date(),
-        suggestions: response.data.suggestions || [],
-      };
+      setMessages((prev) => [
+        ...prev,
+        {
+          id: aiMessageId,
+          type: "ai",
+          content: "",
+          timestamp: new Date(),
+          suggestions: [],
+        },
+      ]);
+      setIsLoading(false);
+
+      const updateAiMessage = (update) =>
+        setMessages((prev) =>
+          prev.map((message) =>
+            message.id === aiMessageId ? update(message) : message
+          )
+        );
 
-      setMessages((prev) => [...prev, aiMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const event of events) {
+          if (!event.startsWith("data: ")) continue;
+          const data = JSON.parse(event.slice(6));
+          if (data.error) throw new Error(data.error);
+          if (data.delta) {
+            updateAiMessage((message) => ({
+              ...message,
+              content: message.content + data.delta,
+            }));
+          }
+          if (data.done) {
+            updateAiMessage((message) => ({
+              ...message,
+              suggestions: data.suggestions || [],
+            }));
+          }
+        }
+      }
     } catch (error) {
+      if (error.retryAfter) {
+        setMessages((prev) => [
+          ...withoutAiMessage(prev),
+          {
+            id: Date.now() + 1,
+            type: "ai",
+            content: `Wow, so many great questions! Give me about ${error.retryAfter} seconds to catch my breath, then ask me again.`,
+            timestamp: new Date(),
+          },
+        ]);
+        return;
+      }
       console.error("AI chat error:", error);
       const errorMessage = {
         id: Date.now() + 1,
@@ -103,7 +164,7 @@ const AIChatBot = ({ onClose, user, lessonContext = null }) => {
           "I'm having some technical difficulties right now, but I'm still here to help! Try asking me about basic dental care, and I'll do my best to assist you.",
         timestamp: new Date(),
       };
-      setMessages((prev) => [...prev, errorMessage]);
+      setMessages((prev) => [...withoutAiMessage(prev), errorMessage]);
       toast.error(
         "Dr. Rabbit is having some technical issues, but still wants to help!"
       );
@@ -52,23 +52,24 @@ const ProfilePage = ({ user, setUser }) => {
 
   const fetchUserProgress = async () => {
     try {
-      const response = await axios.get(`${API}/users/${user.id}/progress`);
-      setUserProgress(response.data);
-      calculateStats(response.data);
+      const [summaryResponse, progressResponse] = await Promise.all([
+        axios.get(`${API}/users/${user.id}/summary`),
+        axios.get(`${API}/users/${user.id}/progress/page`, {
+          params: { limit: 5, fields: "id,lesson_id,score,completed" },
+        }),
+      ]);
+      setUserProgress(progressResponse.data.items);
+      calculateStats(summaryResponse.data);
     } catch (error) {
       console.error("Error fetching user progress:", error);
     }
   };
 
-  const calculateStats = (progress) => {
-    const completed = progress.filter((p) => p.completed);
-    const totalScore = completed.reduce((sum, p) => sum + (p.score || 0), 0);
-
+  const calculateStats = (summary) => {
     setStats({
       totalLessons: 10, // Estimated total lessons
-      completedLessons: completed.length,
-      averageScore:
-        completed.length > 0 ? Math.round(totalScore / completed.length) : 0,
+      completedLessons: summary.completed_count,
+      averageScore: summary.average_score,
       totalPoints: user.total_score || 0,
     });
   };
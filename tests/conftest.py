@@ -0,0 +1,65 @@
+import asyncio
+import sys
+import types
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import benchmark  # noqa: E402
+import server  # noqa: E402
+
+
+class FakeCompletions:
+    """Minimal Groq chat.completions stand-in: returns `content` after `delay` seconds and counts calls."""
+    def __init__(self, content="Brush for two minutes.", delay=0.02):
+        self.content = content
+        self.delay = delay
+        self.calls = 0
+
+    async def create(self, messages, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if stream:
+            return self._chunks()
+        message = types.SimpleNamespace(content=self.content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    async def _chunks(self):
+        for word in (self.content or "").split(" "):
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=word + " "))], usage=None)
+
+
+@pytest.fixture
+def groq(monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(server, "groq_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    return completions
+
+
+@pytest.fixture
+def tutor(monkeypatch):
+    """Fresh tutor cache, LLM slots and admission state for each test."""
+    slots = server.LLMSlots(2, 4, 1.0)
+    monkeypatch.setattr(server, "tutor_cache", server.TutorAnswerCache(100, 1 << 20, 60, wait_timeout_seconds=1.0))
+    monkeypatch.setattr(server, "llm_slots", slots)
+    monkeypatch.setattr(server, "tutor_admission", server.TutorAdmission(slots, 60, 10, 600, 100, 100))
+    monkeypatch.setattr(server, "tutor_memory", server.TutorMemory(100, 1 << 20, 0, 60))
+    return server.tutor_cache
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """The benchmark's in-memory MongoDB stand-in, wired into the app with an empty lesson catalog."""
+    database = benchmark.InMemoryDatabase()
+    monkeypatch.setattr(server.app, "db", database, raising=False)
+    monkeypatch.setattr(server, "lesson_catalog", server.LessonCatalog(60))
+    return database
+
+
+@pytest.fixture
+def api():
+    """Factory for an HTTP client bound to the app; create it inside the test's event loop."""
+    return lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test")
@@ -0,0 +1,35 @@
+import asyncio
+
+import server
+
+
+def test_user_over_their_rate_gets_429_with_retry_after(api, groq, tutor, monkeypatch):
+    monkeypatch.setattr(server, "tutor_admission", server.TutorAdmission(server.llm_slots, 6, 1, 600, 100, 100))
+
+    async def run():
+        async with api() as c:
+            ask = lambda question: c.post("/ai/ask", json={"question": question, "user_id": "u1"})
+            return [await ask("first"), await ask("second"), await ask("first")]
+
+    first, limited, cached = asyncio.run(run())
+    assert first.status_code == 200
+    assert limited.status_code == 429
+    assert 1 <= int(limited.headers["retry-after"]) <= 10
+    assert cached.status_code == 200  # cached answers are not charged
+    assert groq.calls == 1
+
+
+def test_streaming_requests_beyond_the_queue_get_429(api, groq, tutor, monkeypatch):
+    slots = server.LLMSlots(1, 0, 1.0)
+    monkeypatch.setattr(server, "llm_slots", slots)
+    monkeypatch.setattr(server, "tutor_admission", server.TutorAdmission(slots, 600, 100, 600, 100, 100))
+
+    async def run():
+        async with api() as c:
+            return await asyncio.gather(*[c.post("/ai/ask/stream", json={"question": f"q{i}"}) for i in range(3)])
+
+    responses = asyncio.run(run())
+    assert sorted(r.status_code for r in responses) == [200, 429, 429]
+    assert all(r.headers["retry-after"] == "1" for r in responses if r.status_code == 429)
+    assert all('"error"' not in r.text for r in responses)
+    assert slots.in_flight == 0 and not slots._semaphore.locked()
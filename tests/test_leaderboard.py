@@ -0,0 +1,52 @@
+import random
+
+import server
+
+
+def brute_rank(scores, score):
+    return 1 + sum(1 for other in scores if other > score)
+
+
+def test_score_ranks_match_brute_force():
+    ranks = server.ScoreRanks()
+    scores = [random.randint(0, 5000) for _ in range(500)] + [2_000_000]
+    for score in scores:
+        ranks.add(score)
+    for score in random.sample(scores, 50):
+        ranks.remove(score)
+        scores.remove(score)
+    assert ranks.total == len(scores)
+    for probe in random.sample(scores, 100) + [0, 6000, 3_000_000]:
+        assert ranks.rank(probe) == brute_rank(scores, probe)
+
+
+def test_score_ranks_memory_tracks_distinct_scores():
+    ranks = server.ScoreRanks()
+    ranks.add(2_000_000)
+    ranks.add(5)
+    assert len(ranks._tree) <= 2 * 33
+    ranks.remove(2_000_000)
+    ranks.remove(5)
+    assert ranks._tree == {} and ranks.total == 0
+
+
+def test_leaderboard_top_and_ranks_per_scope():
+    board = server.Leaderboard(3, 1e9)
+    scores = {}
+    for i in range(30):
+        board.add_user(f"u{i}", f"n{i}", 1 + i % 2, 0)
+        scores[f"u{i}"] = 0
+    for _ in range(500):
+        user_id = f"u{random.randrange(30)}"
+        delta = random.choice([0, 10, 50, 100])
+        board.add_score(user_id, delta)
+        scores[user_id] += delta
+    board.add_score("u0", -1000)  # ignored: totals only grow
+
+    expected = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:3]
+    assert [(entry["user_id"], entry["total_score"]) for entry in board.top()] == expected
+    for user_id, score in scores.items():
+        level = 1 + int(user_id[1:]) % 2
+        assert board.scopes[None].ranks.rank(score) == brute_rank(scores.values(), score)
+        level_scores = [s for uid, s in scores.items() if 1 + int(uid[1:]) % 2 == level]
+        assert board.scopes[level].ranks.rank(score) == brute_rank(level_scores, score)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+def lesson(i, level=1, **extra):
+    return {"id": f"L{i}", "title": f"Lesson {i}", "description": "d", "level": level, "content": {"key_points": ["a"]}, "quiz_questions": [{"question": "q", "options": ["A", "B"], "correct_answer": "A"}], **extra}
+
+
+def parse_in_chunks(text, size):
+    parser = server.LessonRecordParser()
+    data = text.encode("utf-8")
+    records = []
+    for start in range(0, len(data), size):
+        records += parser.feed(data[start:start + size])
+    return records + parser.feed(b"", final=True)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+@pytest.mark.parametrize("layout", ["ndjson", "array"])
+def test_parser_handles_any_chunk_boundary(size, layout):
+    records = [lesson(i, title=f"Zähne {i} 🦷") for i in range(5)]
+    text = "\n".join(json.dumps(record, ensure_ascii=False) for record in records) + "\n" if layout == "ndjson" else json.dumps(records, ensure_ascii=False, indent=1)
+    assert parse_in_chunks(text, size) == records
+
+
+@pytest.mark.parametrize("text", ['{"id": "L1"}\n{bad json}\n', '[{"id": "L1"}, {"id": ', '{"id": "L1"} oops'])
+def test_parser_rejects_malformed_input(text):
+    with pytest.raises(ValueError):
+        parse_in_chunks(text, 4)
+
+
+def test_parser_bounds_record_size():
+    parser = server.LessonRecordParser(max_record_bytes=32)
+    with pytest.raises(ValueError):
+        parser.feed(b'{"id": "' + b"x" * 64)
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "secret")
+    return {"x-admin-token": "secret"}
+
+
+def import_lessons(api, admin, body, **params):
+    async def run():
+        async with api() as c:
+            response = await c.post("/admin/lessons/import", content=body, params=params, headers=admin)
+            lessons = await c.get("/lessons")
+            return response, sorted(item["id"] for item in lessons.json())
+    return asyncio.run(run())
+
+
+def test_import_upserts_in_batches_and_swaps_in_staging(api, admin, db):
+    body = "\n".join(json.dumps(lesson(i, 1 + i % 3)) for i in range(7)) + '\n{"id": "broken"}\n'
+    response, served = import_lessons(api, admin, body, batch_size=3)
+    report = response.json()
+    assert response.status_code == 200
+    assert (report["status"], report["imported"], report["invalid"], report["batches"]) == ("completed", 7, 1, 3)
+    assert served == [f"L{i}" for i in range(7)]
+    assert list(db._collections) == ["lessons"]
+
+
+def test_prune_removes_lessons_missing_from_the_file(api, admin, db):
+    import_lessons(api, admin, json.dumps([lesson(i) for i in range(4)]))
+    response, served = import_lessons(api, admin, json.dumps([lesson(1), lesson(9)]), prune="true")
+    assert response.json()["pruned"] == 3
+    assert served == ["L1", "L9"]
+
+
+def test_failed_import_leaves_lessons_untouched(api, admin, db):
+    import_lessons(api, admin, json.dumps([lesson(0), lesson(1)]))
+    body = "\n".join(json.dumps(lesson(i)) for i in range(10, 20)) + "\n{bad json\n"
+    response, served = import_lessons(api, admin, body, batch_size=3)
+    assert response.status_code == 400
+    assert served == ["L0", "L1"]
+    assert sorted(doc["id"] for doc in db.lessons.docs) == ["L0", "L1"]
+    assert list(db._collections) == ["lessons"]
+    assert server.LessonImport.latest["status"] == "failed"
+
+
+def test_initialize_data_refuses_to_race_an_import(api, db):
+    async def run():
+        async with server.lesson_import_lock:
+            async with api() as c:
+                return await c.post("/initialize-data")
+    assert asyncio.run(run()).status_code == 409
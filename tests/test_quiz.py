@@ -0,0 +1,47 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("answers, score, passed", [
+    (["A", "B", "C", "D"], 100, True),
+    (["A", "B", "C", "x"], 75, True),
+    (["A", "x", "x"], 25, False),
+    ([], 0, False),
+])
+def test_grade_submission(answers, score, passed):
+    result = server.grade_submission(("A", "B", "C", "D"), [{"selected_option": answer} for answer in answers])
+    assert (result["score"], result["passed"], result["total_questions"]) == (score, passed, 4)
+    assert result["correct_answers"] == sum(1 for expected, answer in zip("ABCD", answers) if expected == answer)
+
+
+def test_grade_submission_without_questions():
+    assert server.grade_submission((), [{"selected_option": "A"}])["score"] == 0
+
+
+def test_progress_pages_follow_the_keyset_cursor(api, db):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    # Pairs of records share a timestamp, so paging must break ties on id.
+    docs = [{"id": f"p{i:02d}", "user_id": "u1", "lesson_id": "L1", "completed": True, "score": i, "completed_at": start + timedelta(minutes=i // 2)} for i in range(11)]
+    db.user_progress.docs = [dict(doc) for doc in docs] + [{**docs[0], "id": "other", "user_id": "u2"}]
+    db.user_progress._reindex()
+
+    async def run():
+        pages, cursor = [], None
+        async with api() as c:
+            while True:
+                params = {"limit": 4, "fields": "score", **({"cursor": cursor} if cursor else {})}
+                body = (await c.get("/users/u1/progress/page", params=params)).json()
+                pages.append(body["items"])
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    return pages, (await c.get("/users/u1/progress/page", params={"cursor": "not-a-cursor"})).status_code
+
+    pages, bad_cursor = asyncio.run(run())
+    assert [len(page) for page in pages] == [4, 4, 3]
+    assert [item["score"] for page in pages for item in page] == list(range(10, -1, -1))
+    assert all(set(item) == {"score"} for page in pages for item in page)
+    assert bad_cursor == 400
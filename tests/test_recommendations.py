@@ -0,0 +1,40 @@
+import server
+
+
+def catalog_with(levels):
+    catalog = server.LessonCatalog(60)
+    catalog._build([{"id": lesson_id, "title": lesson_id, "description": "d", "level": level, "content": {}} for level, ids in levels.items() for lesson_id in ids])
+    return catalog
+
+
+def ranked(monkeypatch, best_scores_rows, limit=10):
+    monkeypatch.setattr(server, "lesson_catalog", catalog_with({1: ["a1", "a2", "a3"], 2: ["b1", "b2"], 3: ["c1"]}))
+    recommender = server.LessonRecommender(limit, 100, 60)
+    recommender._ensure_index()
+    return recommender.rank(recommender.score_matrix(best_scores_rows))
+
+
+def summary(result):
+    return result["level"], [(item["lesson_id"], item["reason"]) for item in result["items"]]
+
+
+def test_retries_come_first_lowest_score_first_then_next_then_stretch(monkeypatch):
+    [result] = ranked(monkeypatch, [{"a1": 40, "a2": 10, "x-unknown": 5}])
+    assert summary(result) == (1, [("a2", "retry"), ("a1", "retry"), ("a3", "next"), ("b1", "stretch"), ("b2", "stretch")])
+    assert result["items"][0]["best_score"] == 10 and result["items"][2]["best_score"] is None
+
+
+def test_target_is_the_first_level_not_yet_mastered(monkeypatch):
+    mastered_level_one = {"a1": 100, "a2": 70, "a3": 90}
+    results = ranked(monkeypatch, [mastered_level_one, {**mastered_level_one, "b1": 80, "b2": 75, "c1": 100}, {**mastered_level_one, "b1": 20}], limit=2)
+    assert [summary(result) for result in results] == [
+        (2, [("b1", "next"), ("b2", "next")]),
+        (3, []),
+        (2, [("b1", "retry"), ("b2", "next")]),
+    ]
+
+
+def test_batch_ranking_matches_single_user_ranking(monkeypatch):
+    rows = [{}, {"a1": 50}, {"a1": 100, "a2": 100, "a3": 100, "b2": 0}, {"c1": 30}]
+    batch = ranked(monkeypatch, rows, limit=3)
+    assert [summary(result) for result in batch] == [summary(ranked(monkeypatch, [row], limit=3)[0]) for row in rows]
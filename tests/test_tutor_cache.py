@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def test_coalesced_waiters_get_empty_answer_and_it_is_not_cached(api, groq, tutor):
+    groq.content = None
+
+    async def run():
+        async with api() as c:
+            responses = await asyncio.wait_for(asyncio.gather(*[c.post("/ai/ask", json={"question": "Why floss?"}) for _ in range(3)]), 3)
+            return responses, await c.post("/ai/ask", json={"question": "Why floss?"})
+
+    responses, again = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert {r.json()["response"] for r in responses} == {""}
+    assert again.status_code == 200
+    assert groq.calls == 2
+    assert tutor.stats()["inflight"] == 0 and tutor.stats()["entries"] == 0
+
+
+def test_identical_questions_share_one_upstream_call(api, groq, tutor):
+    async def run():
+        async with api() as c:
+            return await asyncio.gather(*[c.post("/ai/ask", json={"question": "How long should I brush?"}) for _ in range(5)])
+
+    responses = asyncio.run(run())
+    assert all(r.json()["response"] == "Brush for two minutes." for r in responses)
+    assert groq.calls == 1
+    stats = tutor.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 0)
+
+
+def test_waiters_retry_when_the_leader_is_cancelled(tutor):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.create_task(tutor.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(tutor.get_or_compute("k", compute)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(run()) == ["answer", "answer"]
+    assert len(calls) == 2
+
+
+def test_waiters_give_up_after_the_wait_timeout():
+    cache = server.TutorAnswerCache(10, 1 << 16, 60, wait_timeout_seconds=0.05)
+
+    async def run():
+        leader = asyncio.create_task(cache.get_or_compute("k", lambda: asyncio.sleep(1, "late")))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await cache.get_or_compute("k", lambda: asyncio.sleep(1, "late"))
+        finally:
+            leader.cancel()
+
+    asyncio.run(run())